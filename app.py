@@ -1,147 +1,94 @@
+import os
+from contextlib import nullcontext
+
 import streamlit as st
 import numpy as np
-import plotly.graph_objects as go
+import pandas as pd
+
+from smartacid_core import (
+    LABELS_WATERFALL,
+    NAMES,
+    ORDER,
+    PALETTE,
+    RULES,
+    compute_business_case,
+    fmt_money,
+    waterfall_benefit,
+)
 
 st.set_page_config(page_title="SmartAcid Curado – Business Case", layout="wide")
 
-# ---------------------------------------------------------
-# Utils
-# ---------------------------------------------------------
-ORDER = ["C1", "C2", "C3", "C4"]
-NAMES = {
-    "C1": "C1 – Soft Sensor P80",
-    "C2": "C2 – Clusterización UGMs",
-    "C3": "C3 – Mineral Tracker",
-    "C4": "C4 – Polinomio + Control",
-}
-PALETTE = ["#328BA1", "#DEA942", "#DC5214", "#328BA1"]  # para barras si quieres extender
-
-def fmt_money(x):
-    return f"${x:,.0f}"
-
-def waterfall_benefit(benefits, labels, title):
-    measure = ["relative"] * len(benefits) + ["total"]
-    x = labels + ["Total"]
-    y = benefits + [sum(benefits)]
-    fig = go.Figure(go.Waterfall(
-        name="Beneficio",
-        orientation="v",
-        measure=measure,
-        x=x,
-        y=y,
-        connector={"line": {"width": 1}},
-        decreasing={"marker": {"color": "#DC5214"}},  # naranja para negativos (no esperamos)
-        increasing={"marker": {"color": "#328BA1"}},  # azul para positivos
-        totals={"marker": {"color": "#DEA942"}}       # dorado para total
-    ))
-    fig.update_layout(
-        title=title,
-        showlegend=False,
-        yaxis_title="USD/año",
-        margin=dict(l=10, r=10, t=60, b=10)
-    )
-    return fig
-
-# ---------------------------------------------------------
-# Reglas de recorte (cuando se superan límites técnicos)
-# ---------------------------------------------------------
-def allocate_sequential(deltas, limit_excess):
-    """
-    deltas: lista de aportes absolutos por componente (>=0) en orden C1..C4
-    limit_excess: exceso a recortar (>=0)
-    Retorna lista con aportes acreditados luego del recorte secuencial.
-    """
-    credited = []
-    remaining_excess = max(limit_excess, 0.0)
-    for d in deltas:
-        if remaining_excess <= 0:
-            credited.append(d)
-        else:
-            take = max(d - remaining_excess, 0.0)
-            credited.append(take)
-            remaining_excess = max(remaining_excess - d, 0.0)
-    return credited
-
-def allocate_proportional(deltas, limit_excess):
-    """
-    Reparte el recorte proporcionalmente a los propios deltas.
-    """
-    S = sum(deltas)
-    if S <= 0 or limit_excess <= 0:
-        return deltas[:]
-    factor = max(1.0 - limit_excess / S, 0.0)
-    return [max(d * factor, 0.0) for d in deltas]
-
-def allocate_weighted(deltas, weights, limit_excess):
-    """
-    Reparte el recorte proporcional a weights*deltas.
-    weights: lista de pesos >=0 (no es necesario que sumen 1, se normalizan por construcción).
-    credited_i = d_i - excess * (w_i * d_i) / sum_j(w_j * d_j)
-    """
-    wd = [w * d for w, d in zip(weights, deltas)]
-    S = sum(wd)
-    if S <= 0 or limit_excess <= 0:
-        return deltas[:]
-    credited = []
-    for d, wd_i in zip(deltas, wd):
-        cut_i = limit_excess * (wd_i / S)
-        credited.append(max(d - cut_i, 0.0))
-    return credited
+# Profiling opt-in (SMARTACID_PROFILE=1): mide cálculo, figura y envío del gráfico
+if os.getenv("SMARTACID_PROFILE"):
+    import cProfile
+    import io
+    import pstats
+    profiler = cProfile.Profile()
+else:
+    profiler = None
+profiled = profiler if profiler is not None else nullcontext()
 
 # ---------------------------------------------------------
 # Sidebar: Inputs (todos parten en 0 según tu requerimiento)
 # ---------------------------------------------------------
-st.sidebar.header("Parámetros de operación")
-T_Mt  = st.sidebar.slider("Toneladas tratadas (Mt/a)", 0.0, 20.0, 10.0, 0.1)
-G_pct = st.sidebar.slider("Ley de Cu total (%)", 0.00, 1.00, 0.50, 0.01)
-R0_pct = st.sidebar.slider("Recuperación base R0 (%)", 0.0, 100.0, 60.0, 0.5)
-A0_kgpt = st.sidebar.slider("Consumo ácido base A0 (kg/t)", 0.0, 100.0, 35.0, 0.5)
-
-st.sidebar.header("Precios")
-P_Cu   = st.sidebar.slider("Precio Cu (US$/t)", 0, 11000, 9000, 50)
-P_Acid = st.sidebar.slider("Precio ácido (US$/t H2SO4)", 0, 150, 120, 5)
-
-st.sidebar.header("Límites técnicos")
-Rmax_pct  = st.sidebar.slider("Recuperación máx. Rmax (%)", 0.0, 100.0, 75.0, 0.5)
-Amin_kgpt = st.sidebar.slider("Ácido mín. Amin (kg/t)", 0.0, 100.0, 20.0, 0.5)
-
-st.sidebar.caption(
-    "Rmax: techo técnico de recuperación. Amin: piso técnico de ácido.\n"
-    "Si Rmax < R0 no habrá mejora posible; si Amin > A0 no habrá ahorro posible."
-)
-
-st.sidebar.header("Activación de componentes")
-C1 = st.sidebar.checkbox(NAMES["C1"], True)
-C2 = st.sidebar.checkbox(NAMES["C2"], True)
-C3 = st.sidebar.checkbox(NAMES["C3"], True)
-C4 = st.sidebar.checkbox(NAMES["C4"], True)
-switches = {"C1": int(C1), "C2": int(C2), "C3": int(C3), "C4": int(C4)}
-
-st.sidebar.header("Aportes absolutos por componente")
-st.sidebar.caption("ΔR en puntos porcentuales (+pts %). ΔA en kg/t ahorrados.")
-colR1, colR2 = st.sidebar.columns(2)
-# Defaults mapeados desde el benchmark anterior
-dR_C1 = colR1.number_input("ΔR C1 (pts %)", 0.0, 20.0, 0.5, 0.1)
-dR_C2 = colR1.number_input("ΔR C2 (pts %)", 0.0, 20.0, 1.2, 0.1)
-dR_C3 = colR1.number_input("ΔR C3 (pts %)", 0.0, 20.0, 0.7, 0.1)
-dR_C4 = colR1.number_input("ΔR C4 (pts %)", 0.0, 20.0, 3.0, 0.1)
-
-dA_C1 = colR2.number_input("ΔA C1 (kg/t)", 0.0, 50.0, 0.7, 0.1)
-dA_C2 = colR2.number_input("ΔA C2 (kg/t)", 0.0, 50.0, 1.4, 0.1)
-dA_C3 = colR2.number_input("ΔA C3 (kg/t)", 0.0, 50.0, 1.1, 0.1)
-dA_C4 = colR2.number_input("ΔA C4 (kg/t)", 0.0, 50.0, 3.3, 0.1)
-
-st.sidebar.header("Regla de recorte ante límites técnicos")
-rule = st.sidebar.selectbox("Selecciona regla", ["Secuencial", "Proporcional", "Ponderada"])
+# Un solo formulario: los cambios se aplican juntos al presionar "Recalcular"
+with st.sidebar.form("params"):
+    st.header("Parámetros de operación")
+    T_Mt  = st.slider("Toneladas tratadas (Mt/a)", 0.0, 20.0, 10.0, 0.1)
+    G_pct = st.slider("Ley de Cu total (%)", 0.00, 1.00, 0.50, 0.01)
+    R0_pct = st.slider("Recuperación base R0 (%)", 0.0, 100.0, 60.0, 0.5)
+    A0_kgpt = st.slider("Consumo ácido base A0 (kg/t)", 0.0, 100.0, 35.0, 0.5)
+
+    st.header("Precios")
+    P_Cu   = st.slider("Precio Cu (US$/t)", 0, 11000, 9000, 50)
+    P_Acid = st.slider("Precio ácido (US$/t H2SO4)", 0, 150, 120, 5)
+
+    st.header("Límites técnicos")
+    Rmax_pct  = st.slider("Recuperación máx. Rmax (%)", 0.0, 100.0, 75.0, 0.5)
+    Amin_kgpt = st.slider("Ácido mín. Amin (kg/t)", 0.0, 100.0, 20.0, 0.5)
+
+    st.caption(
+        "Rmax: techo técnico de recuperación. Amin: piso técnico de ácido.\n"
+        "Si Rmax < R0 no habrá mejora posible; si Amin > A0 no habrá ahorro posible."
+    )
 
-weights = [1.0, 1.0, 1.0, 1.0]
+    st.header("Activación de componentes")
+    C1 = st.checkbox(NAMES["C1"], True)
+    C2 = st.checkbox(NAMES["C2"], True)
+    C3 = st.checkbox(NAMES["C3"], True)
+    C4 = st.checkbox(NAMES["C4"], True)
+    switch_arr = np.array([C1, C2, C3, C4], dtype=np.float64)
+
+    st.header("Aportes absolutos por componente")
+    st.caption("ΔR en puntos porcentuales (+pts %). ΔA en kg/t ahorrados.")
+    colR1, colR2 = st.columns(2)
+    # Defaults mapeados desde el benchmark anterior
+    dR_C1 = colR1.number_input("ΔR C1 (pts %)", 0.0, 20.0, 0.5, 0.1)
+    dR_C2 = colR1.number_input("ΔR C2 (pts %)", 0.0, 20.0, 1.2, 0.1)
+    dR_C3 = colR1.number_input("ΔR C3 (pts %)", 0.0, 20.0, 0.7, 0.1)
+    dR_C4 = colR1.number_input("ΔR C4 (pts %)", 0.0, 20.0, 3.0, 0.1)
+
+    dA_C1 = colR2.number_input("ΔA C1 (kg/t)", 0.0, 50.0, 0.7, 0.1)
+    dA_C2 = colR2.number_input("ΔA C2 (kg/t)", 0.0, 50.0, 1.4, 0.1)
+    dA_C3 = colR2.number_input("ΔA C3 (kg/t)", 0.0, 50.0, 1.1, 0.1)
+    dA_C4 = colR2.number_input("ΔA C4 (kg/t)", 0.0, 50.0, 3.3, 0.1)
+    dR_arr = np.array([dR_C1, dR_C2, dR_C3, dR_C4], dtype=np.float64)
+    dA_arr = np.array([dA_C1, dA_C2, dA_C3, dA_C4], dtype=np.float64)
+
+    st.header("Regla de recorte ante límites técnicos")
+    rule = st.selectbox("Selecciona regla", RULES)
+
+    st.caption("Pesos relativos por componente (solo regla Ponderada; se normalizan por construcción).")
+    w1 = st.slider("Peso C1", 0.0, 5.0, 1.0, 0.1)
+    w2 = st.slider("Peso C2", 0.0, 5.0, 1.0, 0.1)
+    w3 = st.slider("Peso C3", 0.0, 5.0, 1.0, 0.1)
+    w4 = st.slider("Peso C4", 0.0, 5.0, 1.0, 0.1)
+
+    submitted = st.form_submit_button("Recalcular")
+
+weight_arr = np.ones(len(ORDER))
 if rule == "Ponderada":
-    st.sidebar.caption("Pesos relativos por componente (arbitrarios, se normalizan por construcción).")
-    w1 = st.sidebar.slider("Peso C1", 0.0, 5.0, 1.0, 0.1)
-    w2 = st.sidebar.slider("Peso C2", 0.0, 5.0, 1.0, 0.1)
-    w3 = st.sidebar.slider("Peso C3", 0.0, 5.0, 1.0, 0.1)
-    w4 = st.sidebar.slider("Peso C4", 0.0, 5.0, 1.0, 0.1)
-    weights = [w1, w2, w3, w4]
+    weight_arr = np.array([w1, w2, w3, w4], dtype=np.float64)
 
 # ---------------------------------------------------------
 # Validaciones UI
@@ -158,61 +105,24 @@ if P_Cu == 0 and P_Acid == 0:
 # ---------------------------------------------------------
 # Cálculos principales (modelo aditivo con topes)
 # ---------------------------------------------------------
-# Toneladas y cobre en alimentación
-T = T_Mt * 1_000_000.0
-Cu_in_tpy = T * (G_pct / 100.0)
-
-# Deltas por componente (aportes absolutos) y switches
-dR_list = [dR_C1, dR_C2, dR_C3, dR_C4]
-dA_list = [dA_C1, dA_C2, dA_C3, dA_C4]
-active_mask = [switches[c] == 1 for c in ORDER]
-
-# Aplica switches (componentes apagados = 0 aporte)
-dR_active = [d if m else 0.0 for d, m in zip(dR_list, active_mask)]
-dA_active = [d if m else 0.0 for d, m in zip(dA_list, active_mask)]
-
-# Recuperación: suma y tope
-R_raw = R0_pct + sum(dR_active)
-excess_R = max(R_raw - Rmax_pct, 0.0)
-if rule == "Secuencial":
-    dR_accredited = allocate_sequential(dR_active, excess_R)
-elif rule == "Proporcional":
-    dR_accredited = allocate_proportional(dR_active, excess_R)
-else:
-    dR_accredited = allocate_weighted(dR_active, weights, excess_R)
-R_final = R0_pct + sum(dR_accredited)
-
-# Ácido: ahorro y piso
-A_raw = A0_kgpt - sum(dA_active)
-excess_A = max((Amin_kgpt - A_raw), 0.0)  # cuánto ahorro hay que recortar para no bajar de Amin
-if rule == "Secuencial":
-    dA_accredited = allocate_sequential(dA_active, excess_A)
-elif rule == "Proporcional":
-    dA_accredited = allocate_proportional(dA_active, excess_A)
-else:
-    dA_accredited = allocate_weighted(dA_active, weights, excess_A)
-A_final = A0_kgpt - sum(dA_accredited)
-
-# KPIs operacionales
-dR_total_pts = R_final - R0_pct                # puntos %
-dA_total_kgpt = A0_kgpt - A_final              # kg/t
-dCu_tpy = Cu_in_tpy * (dR_total_pts / 100.0)   # t/a
-acid_saved_tpy = T * (dA_total_kgpt / 1000.0)  # t/a
-
-# Beneficios
-B_Cu = dCu_tpy * P_Cu
-B_Acid = acid_saved_tpy * P_Acid
-B_total = B_Cu + B_Acid
-
-# Beneficio por componente (acreditado)
-B_by = []
-for i, c in enumerate(ORDER):
-    dR_i = dR_accredited[i]
-    dA_i = dA_accredited[i]
-    dCu_i = Cu_in_tpy * (dR_i / 100.0)
-    acid_saved_i_tpy = T * (dA_i / 1000.0)
-    B_i = dCu_i * P_Cu + acid_saved_i_tpy * P_Acid
-    B_by.append(B_i)
+# Solo recalcula al enviar el formulario; entre envíos se muestra el último resultado
+if submitted or "res" not in st.session_state:
+    with profiled:
+        st.session_state["res"] = compute_business_case(
+            T_Mt, G_pct, R0_pct, A0_kgpt, P_Cu, P_Acid, Rmax_pct, Amin_kgpt,
+            switch_arr, dR_arr, dA_arr, rule, weight_arr,
+        )
+res = st.session_state["res"]
+R_final = res["R_final"]
+A_final = res["A_final"]
+dR_total_pts = res["dR_total_pts"]
+dA_total_kgpt = res["dA_total_kgpt"]
+dCu_tpy = res["dCu_tpy"]
+acid_saved_tpy = res["acid_saved_tpy"]
+B_total = res["B_total"]
+B_by = res["B_by"]
+dR_accredited = res["dR_accredited"]
+dA_accredited = res["dA_accredited"]
 
 # ---------------------------------------------------------
 # UI principal
@@ -246,18 +156,28 @@ k7.metric("Beneficio anual", fmt_money(B_total))
 
 st.divider()
 
-labels = [NAMES[c] for c in ORDER]
-fig = waterfall_benefit(B_by, labels, "Waterfall – Aporte incremental acreditado (USD/año)")
-st.plotly_chart(fig, use_container_width=True)
+# Reutiliza la figura del rerun anterior si beneficios y etiquetas no cambiaron
+fig_key = (tuple(B_by), LABELS_WATERFALL)
+with profiled:
+    if st.session_state.get("_fig_key") != fig_key:
+        st.session_state["_fig"] = waterfall_benefit(
+            tuple(B_by), LABELS_WATERFALL,
+            "Waterfall – Aporte incremental acreditado (USD/año)", PALETTE,
+        )
+        st.session_state["_fig_key"] = fig_key
+    st.plotly_chart(st.session_state["_fig"], use_container_width=True)
 
 # Tabla de aportes acreditados
 st.subheader("Aportes acreditados por componente (post-límites)")
-rows = []
-for i, c in enumerate(ORDER):
-    rows.append({
-        "Componente": NAMES[c],
-        "Δ Recuperación acreditada (pts %)": round(dR_accredited[i], 3),
-        "Ahorro ácido acreditado (kg/t)": round(dA_accredited[i], 3),
-        "Beneficio (USD/año)": fmt_money(B_by[i]),
-    })
-st.dataframe(rows, use_container_width=True)
+df = pd.DataFrame({
+    "Componente": pd.array(list(LABELS_WATERFALL), dtype="string"),
+    "Δ Recuperación acreditada (pts %)": np.asarray(dR_accredited, dtype=np.float32).round(3),
+    "Ahorro ácido acreditado (kg/t)": np.asarray(dA_accredited, dtype=np.float32).round(3),
+    "Beneficio (USD/año)": pd.array([fmt_money(b) for b in B_by], dtype="string"),
+})
+st.dataframe(df, use_container_width=True)
+
+if profiler is not None:
+    s = io.StringIO()
+    pstats.Stats(profiler, stream=s).sort_stats("cumulative").print_stats(20)
+    st.sidebar.text(s.getvalue())
@@ -0,0 +1,184 @@
+"""
+Núcleo compartido de SmartAcid: constantes, formato, Waterfall, reglas de recorte
+y cálculo del caso de negocio. Las apps Streamlit solo cablean widgets y UI.
+"""
+from types import MappingProxyType
+
+import streamlit as st
+import numpy as np
+from numba import njit
+
+# ---------------------------------------------------------
+# Utils
+# ---------------------------------------------------------
+ORDER = ("C1", "C2", "C3", "C4")
+NAMES = MappingProxyType({
+    "C1": "C1 – Soft Sensor P80",
+    "C2": "C2 – Clusterización UGMs",
+    "C3": "C3 – Mineral Tracker",
+    "C4": "C4 – Polinomio + Control",
+})
+LABELS_WATERFALL = tuple(NAMES[c] for c in ORDER)
+RULES = ("Secuencial", "Proporcional", "Ponderada")
+PALETTE = ("#328BA1", "#DEA942", "#DC5214", "#328BA1")  # para barras si quieres extender
+
+MONEY_FMT = "${:,.0f}".format
+fmt_money = MONEY_FMT
+
+@st.cache_resource
+def _go():
+    """Importa plotly.graph_objects solo al construir el primer gráfico."""
+    import plotly.graph_objects as go
+    return go
+
+@st.cache_resource(max_entries=64)
+def waterfall_benefit(benefits_tuple, labels_tuple, title, palette_tuple):
+    """
+    Construye el Waterfall (cacheado): mismas tuplas de entrada reutilizan la figura.
+    palette_tuple: (positivos, total, negativos, ...).
+    """
+    n = len(benefits_tuple)
+    y = np.empty(n + 1)
+    y[:n] = benefits_tuple
+    y[n] = y[:n].sum()
+    measure = ("relative",) * n + ("total",)
+    x = labels_tuple + ("Total",)
+    go = _go()
+    fig = go.Figure(go.Waterfall(
+        name="Beneficio",
+        orientation="v",
+        measure=measure,
+        x=x,
+        y=y.tolist(),
+        connector={"line": {"width": 1}},
+        decreasing={"marker": {"color": palette_tuple[2]}},  # naranja para negativos (no esperamos)
+        increasing={"marker": {"color": palette_tuple[0]}},  # azul para positivos
+        totals={"marker": {"color": palette_tuple[1]}}       # dorado para total
+    ))
+    fig.update_layout(
+        title=title,
+        showlegend=False,
+        yaxis_title="USD/año",
+        margin=dict(l=10, r=10, t=60, b=10)
+    )
+    return fig
+
+# ---------------------------------------------------------
+# Reglas de recorte (cuando se superan límites técnicos)
+# ---------------------------------------------------------
+@njit(cache=True)
+def allocate_sequential(deltas, limit_excess):
+    """
+    deltas: lista de aportes absolutos por componente (>=0) en orden C1..C4
+    limit_excess: exceso a recortar (>=0)
+    Retorna array con aportes acreditados luego del recorte secuencial.
+    credited_i = max(d_i - max(excess - sum_{j<i} d_j, 0), 0)
+    """
+    d = np.asarray(deltas, dtype=np.float64)
+    prior = np.cumsum(d) - d  # suma de los aportes previos a cada componente
+    remaining = np.maximum(max(limit_excess, 0.0) - prior, 0.0)
+    return np.maximum(d - remaining, 0.0)
+
+@njit(cache=True)
+def allocate_proportional(deltas, limit_excess):
+    """
+    Reparte el recorte proporcionalmente a los propios deltas.
+    """
+    d = np.asarray(deltas, dtype=np.float64)
+    S = d.sum()
+    if S <= 0.0 or limit_excess <= 0.0:
+        return d.copy()
+    factor = max(1.0 - limit_excess / S, 0.0)
+    return np.maximum(d * factor, 0.0)
+
+@njit(cache=True)
+def allocate_weighted(deltas, weights, limit_excess):
+    """
+    Reparte el recorte proporcional a weights*deltas.
+    weights: lista de pesos >=0 (no es necesario que sumen 1, se normalizan por construcción).
+    credited_i = d_i - excess * (w_i * d_i) / sum_j(w_j * d_j)
+    """
+    d = np.asarray(deltas, dtype=np.float64)
+    wd = np.asarray(weights, dtype=np.float64) * d
+    S = wd.sum()
+    if S <= 0.0 or limit_excess <= 0.0:
+        return d.copy()
+    return np.maximum(d - limit_excess * (wd / S), 0.0)
+
+# ---------------------------------------------------------
+# Cálculos principales (modelo aditivo con topes)
+# ---------------------------------------------------------
+@njit(cache=True)
+def _compute_kernel(T, G, R0, A0, P_Cu, P_Acid, Rmax, Amin, s, dR, dA, rule_code, weights):
+    """
+    Núcleo numérico compilado con numba (NUMBA_DISABLE_JIT=1 lo desactiva en desarrollo).
+    rule_code: índice en RULES. Retorna escalares + arrays acreditados y B_by.
+    """
+    # Toneladas y cobre en alimentación
+    T_tpy = T * 1_000_000.0
+    Cu_in_tpy = T_tpy * (G / 100.0)
+
+    # Aplica switches (componentes apagados = 0 aporte)
+    dR_active = s * dR
+    dA_active = s * dA
+
+    # Excesos sobre el tope de recuperación y el piso de ácido
+    excess_R = max(R0 + dR_active.sum() - Rmax, 0.0)
+    excess_A = max(Amin - (A0 - dA_active.sum()), 0.0)  # cuánto ahorro hay que recortar para no bajar de Amin
+    if rule_code == 0:
+        dR_accredited = allocate_sequential(dR_active, excess_R)
+        dA_accredited = allocate_sequential(dA_active, excess_A)
+    elif rule_code == 1:
+        dR_accredited = allocate_proportional(dR_active, excess_R)
+        dA_accredited = allocate_proportional(dA_active, excess_A)
+    else:
+        dR_accredited = allocate_weighted(dR_active, weights, excess_R)
+        dA_accredited = allocate_weighted(dA_active, weights, excess_A)
+
+    # Beneficio por componente (acreditado)
+    k_cu = Cu_in_tpy * P_Cu / 100.0    # USD/año por punto % de recuperación
+    k_acid = T_tpy * P_Acid / 1000.0   # USD/año por kg/t de ácido ahorrado
+    B_by = k_cu * dR_accredited + k_acid * dA_accredited
+    R_final = R0 + dR_accredited.sum()
+    A_final = A0 - dA_accredited.sum()
+
+    # KPIs operacionales
+    dR_total_pts = R_final - R0                    # puntos %
+    dA_total_kgpt = A0 - A_final                   # kg/t
+    dCu_tpy = Cu_in_tpy * (dR_total_pts / 100.0)   # t/a
+    acid_saved_tpy = T_tpy * (dA_total_kgpt / 1000.0)  # t/a
+
+    # Beneficios
+    B_Cu = dCu_tpy * P_Cu
+    B_Acid = acid_saved_tpy * P_Acid
+    B_total = B_Cu + B_Acid
+
+    return (R_final, A_final, dR_total_pts, dA_total_kgpt, dCu_tpy, acid_saved_tpy,
+            B_total, B_by, dR_accredited, dA_accredited)
+
+@st.cache_data(show_spinner=False, ttl=24 * 60 * 60, max_entries=128)
+def compute_business_case(T_Mt, G_pct, R0_pct, A0_kgpt, P_Cu, P_Acid,
+                          Rmax_pct, Amin_kgpt, s, dR, dA, rule, weights):
+    """
+    Caso de negocio (cacheado por Streamlit): empaqueta entradas y desempaqueta el kernel.
+    s, dR, dA, weights: arrays float64 en orden posicional C1..C4 (s = switches 0/1).
+    Retorna dict con KPIs, aportes acreditados y beneficio por componente.
+    """
+    (R_final, A_final, dR_total_pts, dA_total_kgpt, dCu_tpy, acid_saved_tpy,
+     B_total, B_by, dR_accredited, dA_accredited) = _compute_kernel(
+        float(T_Mt), float(G_pct), float(R0_pct), float(A0_kgpt),
+        float(P_Cu), float(P_Acid), float(Rmax_pct), float(Amin_kgpt),
+        s, dR, dA, RULES.index(rule), weights,
+    )
+    return {
+        "R_final": float(R_final),
+        "A_final": float(A_final),
+        "dR_total_pts": float(dR_total_pts),
+        "dA_total_kgpt": float(dA_total_kgpt),
+        "dCu_tpy": float(dCu_tpy),
+        "acid_saved_tpy": float(acid_saved_tpy),
+        "B_total": float(B_total),
+        "B_by": B_by.tolist(),
+        "dR_accredited": dR_accredited.tolist(),
+        "dA_accredited": dA_accredited.tolist(),
+    }
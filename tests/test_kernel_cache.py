@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numba")
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Ponderada con pesos 0 (S == 0) y un exceso de ácido grande (Amin=45 > A0 - sum(dA))
+SCRIPT = """
+import json
+import numpy as np
+from smartacid_core import RULES, _compute_kernel
+
+s = np.ones(4)
+dR = np.array([0.5, 1.2, 0.7, 3.0])
+dA = np.array([0.7, 1.4, 1.1, 3.3])
+out = _compute_kernel(10.0, 0.5, 60.0, 35.0, 9000.0, 120.0, 75.0, 45.0,
+                      s, dR, dA, RULES.index("Ponderada"), np.zeros(4))
+print(json.dumps({
+    "A_final": float(out[1]),
+    "B_total": float(out[6]),
+    "dA_accredited": out[9].tolist(),
+    "cache_hits": sum(_compute_kernel.stats.cache_hits.values()),
+}))
+"""
+
+
+def _run(cache_dir):
+    env = dict(os.environ, NUMBA_CACHE_DIR=str(cache_dir))
+    env.pop("NUMBA_DISABLE_JIT", None)
+    proc = subprocess.run(
+        [sys.executable, "-c", SCRIPT], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def test_weighted_zero_sum_matches_between_cold_and_cached_kernel(tmp_path):
+    cold = _run(tmp_path)
+    cached = _run(tmp_path)
+
+    assert cold["cache_hits"] == 0
+    assert cached["cache_hits"] > 0
+    # Con S == 0 no hay recorte: los ahorros se acreditan completos
+    assert cold["dA_accredited"] == pytest.approx([0.7, 1.4, 1.1, 3.3])
+    assert cold["A_final"] == pytest.approx(28.5)
+    assert cold["B_total"] == pytest.approx(32_100_000.0)
+    for key in ("A_final", "B_total", "dA_accredited"):
+        assert cached[key] == pytest.approx(cold[key])